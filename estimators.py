@@ -4,14 +4,16 @@ Custom BN structure estimators
 
 
 import itertools
+from collections import deque
 
 import numpy as np
 import pandas as pd
 import networkx as nx
 import matplotlib.pyplot as plt
+from scipy import sparse
+from numba import njit, prange
 from pgmpy.estimators import StructureEstimator
 from pgmpy.base import DAG
-from sklearn.metrics import mutual_info_score
 
 
 def conditional_mutual_info_score(xi, xj, c):
@@ -20,20 +22,289 @@ def conditional_mutual_info_score(xi, xj, c):
     numpy arrays or pandas series for xi and xj and a numpy matrix
     or a a pandas dataframe for c.
     In this implementation c can be given as a single column or as
-    multiple columns.
+    multiple columns; conditioning is on their joint value, not on
+    each column independently.
     '''
+    xi_codes, card_i = _factorize_1d(xi)
+    xj_codes, card_j = _factorize_1d(xj)
     conditions = pd.DataFrame(c)
     if len(conditions.columns) == 0:
-        return mutual_info_score(xi, xj)
-    cond_mutual_info = 0
-    for _, cond in conditions.iteritems():
-        unique_condition_values = cond.unique()
-        for i in unique_condition_values:
-            condition_proba = np.sum(cond == i) / len(cond)
-            cond_mutual_info += mutual_info_score(
-                xi[cond == i], xj[cond == i],
-            ) * condition_proba
-    return np.sum(cond_mutual_info)
+        labels = np.zeros(len(xi_codes), dtype=np.int64)
+        n_groups = 1
+    else:
+        cond_codes, cond_cards = _factorize_columns(conditions)
+        key = np.zeros(len(xi_codes), dtype=np.int64)
+        for k in range(cond_codes.shape[1]):
+            key = key * cond_cards[k] + cond_codes[:, k]
+        _, labels = np.unique(key, return_inverse=True)
+        n_groups = int(labels.max()) + 1
+    order = np.empty(len(xi_codes), dtype=np.int64)
+    starts = np.empty(n_groups + 1, dtype=np.int64)
+    joint = np.empty(card_i * card_j)
+    return _cmi_from_codes(
+        xi_codes.astype(np.int32), xj_codes.astype(np.int32), labels,
+        card_i, card_j, n_groups, order, starts, joint,
+    )
+
+
+def _factorize_1d(values):
+    '''
+    Factorize a single column, returning integer codes and the number
+    of distinct values. pd.factorize marks missing entries with the
+    sentinel -1; shift the codes so missing becomes a regular category
+    and the histogram kernels never see a negative index.
+    '''
+    codes, uniques = pd.factorize(values)
+    n_values = len(uniques)
+    if len(codes) > 0 and codes.min() < 0:
+        codes = codes + 1
+        n_values += 1
+    return codes, n_values
+
+
+def _factorize_columns(df):
+    '''
+    Encode every column of a pandas dataframe as small integer codes.
+    Returns a (n_samples, n_columns) int32 matrix of codes and an int32
+    array with the cardinality of each column.
+    '''
+    n_rows = len(df)
+    n_cols = len(df.columns)
+    codes = np.empty((n_rows, n_cols), dtype=np.int32)
+    cards = np.empty(n_cols, dtype=np.int32)
+    for k, col in enumerate(df.columns):
+        col_codes, card = _factorize_1d(df[col])
+        codes[:, k] = col_codes
+        cards[k] = card
+    return codes, cards
+
+
+def _pairwise_mi_matrix(codes, cards):
+    '''
+    Compute mutual information for every pair of integer-coded columns.
+    Returns an upper-triangular (n_columns, n_columns) matrix.
+    For modest cardinalities all joint contingency tables are assembled
+    at once with a single sparse one-hot GEMM; otherwise the pairwise
+    histogram kernel is used.
+    '''
+    if len(cards) > 0 and int(cards.max()) <= 16:
+        return _pairwise_mi_matrix_gemm(codes, cards)
+    return _pairwise_mi_matrix_histogram(codes, cards)
+
+
+def _pairwise_mi_matrix_gemm(codes, cards):
+    '''
+    Compute the pairwise MI matrix from one sparse matrix product: with
+    X the one-hot row encoding of all columns, X.T @ X holds the joint
+    contingency table of every column pair as a block and every marginal
+    on its diagonal, so a single BLAS-backed GEMM replaces the per-pair
+    histogram passes.
+    '''
+    n_rows, n_cols = codes.shape
+    mi_matrix = np.zeros((n_cols, n_cols))
+    if n_rows == 0:
+        return mi_matrix
+    offsets = np.zeros(n_cols + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum(cards)
+    onehot = sparse.csr_matrix(
+        (
+            np.ones(n_rows * n_cols),
+            (codes + offsets[:-1]).ravel(),
+            np.arange(0, n_rows * n_cols + 1, n_cols),
+        ),
+        shape=(n_rows, int(offsets[-1])),
+    )
+    joint_counts = (onehot.T @ onehot).toarray()
+    marginals = joint_counts.diagonal()
+    for i in range(n_cols):
+        marginal_i = marginals[offsets[i]:offsets[i + 1]]
+        for j in range(i + 1, n_cols):
+            marginal_j = marginals[offsets[j]:offsets[j + 1]]
+            block = joint_counts[
+                offsets[i]:offsets[i + 1], offsets[j]:offsets[j + 1]
+            ]
+            nonzero = block > 0
+            outer = (marginal_i[:, None] * marginal_j[None, :])[nonzero]
+            mi_matrix[i, j] = np.sum(
+                block[nonzero]
+                * (np.log(block[nonzero] * n_rows) - np.log(outer))
+            ) / n_rows
+    return mi_matrix
+
+
+@njit(parallel=True, cache=True)
+def _pairwise_mi_matrix_histogram(codes, cards):
+    '''
+    Compute the pairwise MI matrix with per-pair histogram passes,
+    deriving each score from marginal and joint entropies. The pair
+    computations are independent, so the outer loop runs across cores
+    with numba's prange.
+    '''
+    n_rows, n_cols = codes.shape
+    mi_matrix = np.zeros((n_cols, n_cols))
+    if n_rows == 0:
+        return mi_matrix
+    entropies = np.zeros(n_cols)
+    for i in range(n_cols):
+        counts = np.zeros(cards[i])
+        for t in range(n_rows):
+            counts[codes[t, i]] += 1.0
+        for a in range(cards[i]):
+            if counts[a] > 0:
+                proba = counts[a] / n_rows
+                entropies[i] -= proba * np.log(proba)
+    for i in prange(n_cols):
+        for j in range(i + 1, n_cols):
+            n_cells = np.int64(cards[i]) * np.int64(cards[j])
+            joint = np.zeros(n_cells)
+            for t in range(n_rows):
+                cell = np.int64(codes[t, i]) * cards[j] + codes[t, j]
+                joint[cell] += 1.0
+            joint_entropy = 0.0
+            for a in range(n_cells):
+                if joint[a] > 0:
+                    proba = joint[a] / n_rows
+                    joint_entropy -= proba * np.log(proba)
+            mi_matrix[i, j] = entropies[i] + entropies[j] - joint_entropy
+    return mi_matrix
+
+
+def _mi_from_codes(xi_codes, xj_codes, card_i, card_j):
+    '''
+    Compute mutual information between two integer-coded columns from a
+    single bincount contingency table. Drop-in replacement for
+    sklearn.metrics.mutual_info_score without its per-call label
+    encoding and dense crosstab construction.
+    '''
+    n_rows = len(xi_codes)
+    joint = np.bincount(
+        xi_codes.astype(np.int64) * card_j + xj_codes,
+        minlength=card_i * card_j,
+    ).reshape(card_i, card_j).astype(np.float64)
+    row_totals = joint.sum(axis=1)
+    col_totals = joint.sum(axis=0)
+    nonzero = joint > 0
+    outer = (row_totals[:, None] * col_totals[None, :])[nonzero]
+    return float(np.sum(
+        joint[nonzero] * (np.log(joint[nonzero] * n_rows) - np.log(outer))
+    ) / n_rows)
+
+
+@njit(cache=True)
+def _cmi_from_codes(xi_codes, xj_codes, cond_labels, card_i, card_j,
+                    n_groups, order, starts, joint):
+    '''
+    Compute conditional mutual information I(Xi, Xj | C) from integer
+    codes for xi and xj and group labels for the joint condition. Rows
+    are grouped with a counting sort and each group's joint histogram is
+    accumulated into caller-provided scratch buffers (order, starts and
+    joint), so repeated calls do not allocate.
+    '''
+    n_rows = xi_codes.shape[0]
+    for g in range(n_groups + 1):
+        starts[g] = 0
+    for t in range(n_rows):
+        starts[cond_labels[t] + 1] += 1
+    for g in range(n_groups):
+        starts[g + 1] += starts[g]
+    for t in range(n_rows):
+        g = cond_labels[t]
+        order[starts[g]] = t
+        starts[g] += 1
+    # starts[g] is now the end offset of group g; group g starts where
+    # group g - 1 ends.
+    n_cells = card_i * card_j
+    row_totals = np.zeros(card_i)
+    col_totals = np.zeros(card_j)
+    cond_mutual_info = 0.0
+    begin = 0
+    for g in range(n_groups):
+        end = starts[g]
+        group_total = float(end - begin)
+        if group_total > 0:
+            for a in range(n_cells):
+                joint[a] = 0.0
+            for a in range(card_i):
+                row_totals[a] = 0.0
+            for b in range(card_j):
+                col_totals[b] = 0.0
+            for p in range(begin, end):
+                t = order[p]
+                joint[xi_codes[t] * card_j + xj_codes[t]] += 1.0
+                row_totals[xi_codes[t]] += 1.0
+                col_totals[xj_codes[t]] += 1.0
+            for a in range(card_i):
+                for b in range(card_j):
+                    count = joint[a * card_j + b]
+                    if count > 0:
+                        cond_mutual_info += count * (
+                            np.log(count * group_total)
+                            - np.log(row_totals[a] * col_totals[b])
+                        )
+        begin = end
+    return cond_mutual_info / n_rows
+
+
+def _pairwise_cmi_matrix(codes, cards, cond_codes, cond_card):
+    '''
+    Compute conditional mutual information I(Xi, Xj | C) for every pair
+    of integer-coded columns, given a single integer-coded condition
+    column, as the condition-weighted sum of per-group MI matrices.
+    Returns an upper-triangular (n_columns, n_columns) matrix.
+    '''
+    n_rows = codes.shape[0]
+    cmi_matrix = np.zeros((codes.shape[1], codes.shape[1]))
+    for k in range(cond_card):
+        mask = cond_codes == k
+        condition_proba = np.count_nonzero(mask) / n_rows
+        if condition_proba > 0:
+            cmi_matrix += condition_proba * _pairwise_mi_matrix(
+                codes[mask], cards
+            )
+    return cmi_matrix
+
+
+def _reachable_without(adj, source, removed):
+    '''
+    Return the set of nodes connected to source once removed is taken
+    out of the graph, via a single BFS over an adjacency mapping (an
+    nx.Graph or a plain dict of neighbor sets). A neighbor of removed
+    lies on a simple path between removed and source exactly when it
+    appears in this set, which makes it a linear-time substitute for
+    enumerating all simple paths.
+    '''
+    if source not in adj or removed not in adj:
+        return set()
+    visited = {source}
+    queue = [source]
+    while queue:
+        node = queue.pop()
+        for neighbor in adj[node]:
+            if neighbor != removed and neighbor not in visited:
+                visited.add(neighbor)
+                queue.append(neighbor)
+    return visited
+
+
+def _connected(adj, source, target):
+    '''
+    Return True if target is reachable from source in the adjacency
+    mapping, short-circuiting as soon as target is seen. Equivalent to
+    nx.has_path but without the networkx dispatch overhead.
+    '''
+    if source not in adj or target not in adj:
+        return False
+    visited = {source}
+    queue = deque([source])
+    while queue:
+        node = queue.popleft()
+        for neighbor in adj[node]:
+            if neighbor == target:
+                return True
+            if neighbor not in visited:
+                visited.add(neighbor)
+                queue.append(neighbor)
+    return False
 
 
 def simple_conditional_mutual_info_score(df, xi, xj, c):
@@ -89,16 +360,15 @@ class TreeAugmentedNaiveBayesSearch(StructureEstimator):
         graph = nx.Graph()
         df_features = self.data.loc[:, self.data.columns != self.class_node]
         total_cols = len(df_features.columns)
+        codes, cards = _factorize_columns(df_features)
+        mi_matrix = _pairwise_mi_matrix(codes, cards)
         for i in range(total_cols):
             from_node = df_features.columns[i]
             graph.add_node(from_node)
             for j in range(i + 1, total_cols):
                 to_node = df_features.columns[j]
                 graph.add_node(to_node)
-                mi = mutual_info_score(
-                    df_features.iloc[:, i], df_features.iloc[:, j]
-                )
-                graph.add_edge(from_node, to_node, weight=mi)
+                graph.add_edge(from_node, to_node, weight=mi_matrix[i, j])
         tree = nx.maximum_spanning_tree(graph)
 
         if self.root_node:
@@ -106,8 +376,9 @@ class TreeAugmentedNaiveBayesSearch(StructureEstimator):
         else:
             digraph = nx.bfs_tree(tree, df_features.columns[0])
 
-        for node in df_features.columns:
-            digraph.add_edge(self.class_node, node)
+        digraph.add_edges_from(
+            (self.class_node, node) for node in df_features.columns
+        )
 
         return DAG(digraph)
 
@@ -123,6 +394,7 @@ class BNAugmentedNaiveBayesSearch(StructureEstimator):
         '''
         self.class_node = class_node
         self.epsilon = epsilon
+        self._cmi_cache = {}
 
         super().__init__(data, **kwargs)
 
@@ -134,110 +406,272 @@ class BNAugmentedNaiveBayesSearch(StructureEstimator):
         if self.class_node not in self.data.columns:
             raise ValueError("Class node must exist in data")
 
+        self._cmi_cache.clear()
+
         ################## Drafting #####################
 
-        L = []
         graph = nx.Graph()
         df_features = self.data.loc[
             :, self.data.columns != self.class_node
         ]
         total_cols = len(df_features.columns)
         graph.add_nodes_from(df_features.columns)
-        for i in range(total_cols):
-            from_node = df_features.columns[i]
-            for j in range(i + 1, total_cols):
-                to_node = df_features.columns[j]
-                mi = conditional_mutual_info_score(
-                    df_features.iloc[:, i], df_features.iloc[:, j],
-                    self.data.loc[:, self.class_node]
-                )
-                if mi > self.epsilon:
-                    L.append((from_node, to_node, mi))
-
-        # Sort pairs of nodes by decreasing mutual information
-        L.sort(key=lambda tup: tup[2], reverse=True)
-
-        # Get the first two pairs of nodes and add corresponding edges
-        from_node, to_node, mi = L.pop(0)
-        graph.add_edge(from_node, to_node, weight=mi)
-        from_node, to_node, mi = L.pop(0)
-        graph.add_edge(from_node, to_node, weight=mi)
-
-        # If there is no adjacency path between a pair of nodes, add the corresponding edge
-        lenght = len(L)
-        i = 0
-        while i < lenght:
-            from_node, to_node, mi = L[i]
-            if len(graph.edges) - 1 == len(graph.nodes):
-                break
-            if not nx.has_path(graph, from_node, to_node):
-                graph.add_edge(from_node, to_node, weight=mi)
-                L.pop(i)
-                lenght -= 1
-                i -= 1
-            i += 1
+
+        # Factorize every column once into a single column-contiguous
+        # int32 block; all MI/CMI evaluations below index into it by
+        # column position instead of touching the pandas columns.
+        all_codes, all_cards = _factorize_columns(self.data)
+        self._codes = np.asfortranarray(all_codes)
+        self._cards = all_cards
+        self._name_to_idx = {
+            col: k for k, col in enumerate(self.data.columns)
+        }
+
+        # Scratch buffers reused by every CMI kernel call; sized for the
+        # largest group count (one per row) and joint table possible.
+        n_rows = len(self.data)
+        max_card = int(self._cards.max())
+        self._scratch_order = np.empty(n_rows, dtype=np.int64)
+        self._scratch_starts = np.empty(n_rows + 1, dtype=np.int64)
+        self._scratch_joint = np.empty(max_card * max_card)
+
+        feature_idx = [
+            self._name_to_idx[col] for col in df_features.columns
+        ]
+        class_idx = self._name_to_idx[self.class_node]
+        cmi_matrix = _pairwise_cmi_matrix(
+            self._codes[:, feature_idx], self._cards[feature_idx],
+            self._codes[:, class_idx], int(self._cards[class_idx]),
+        )
+        # Extract the candidate pairs above epsilon from the upper
+        # triangle and order them by decreasing mutual information, all
+        # in NumPy; the stable argsort keeps ties in (i, j) order like
+        # the list sort it replaces.
+        rows, cols = np.triu_indices(total_cols, k=1)
+        weights = cmi_matrix[rows, cols]
+        keep = weights > self.epsilon
+        rows, cols, weights = rows[keep], cols[keep], weights[keep]
+        order = np.argsort(-weights, kind='stable')
+        L = [
+            (df_features.columns[i], df_features.columns[j], mi)
+            for i, j, mi in zip(rows[order], cols[order], weights[order])
+        ]
+
+        # Keep an adjacency dict in sync with the graph so the phases
+        # below get O(1) neighbor-set lookups instead of materializing
+        # nx.neighbors lists per edge.
+        adj = {node: set() for node in df_features.columns}
+
+        def add_edge(from_node, to_node, weight=None):
+            if weight is None:
+                graph.add_edge(from_node, to_node)
+            else:
+                graph.add_edge(from_node, to_node, weight=weight)
+            adj[from_node].add(to_node)
+            adj[to_node].add(from_node)
+
+        def remove_edge(from_node, to_node):
+            graph.remove_edge(from_node, to_node)
+            adj[from_node].discard(to_node)
+            adj[to_node].discard(from_node)
+
+        # Kruskal-style pass with union-find: a pair of nodes is in the
+        # same component exactly when an adjacency path already exists,
+        # so add the edge when the components differ and keep the pair
+        # for the thickening phase otherwise.
+        col_index = {col: k for k, col in enumerate(df_features.columns)}
+        parent = list(range(total_cols))
+        rank = [0] * total_cols
+
+        def find(i):
+            root = i
+            while parent[root] != root:
+                root = parent[root]
+            while parent[i] != root:
+                parent[i], i = root, parent[i]
+            return root
+
+        def union(i, j):
+            if rank[i] < rank[j]:
+                i, j = j, i
+            parent[j] = i
+            if rank[i] == rank[j]:
+                rank[i] += 1
+
+        # Once a single component remains the forest is spanning and no
+        # further candidate can be added, so the rest of L goes straight
+        # to Thickening.
+        n_components = total_cols
+        remaining = []
+        for k, (from_node, to_node, mi) in enumerate(L):
+            root_i = find(col_index[from_node])
+            root_j = find(col_index[to_node])
+            if root_i != root_j:
+                union(root_i, root_j)
+                add_edge(from_node, to_node, mi)
+                n_components -= 1
+                if n_components == 1:
+                    remaining.extend(L[k + 1:])
+                    break
+            else:
+                remaining.append((from_node, to_node, mi))
+        L = remaining
 
         ################## Thickening ###################
 
         for i in range(len(L)):
             from_node, to_node, mi = L[i]
-            if not self.try_to_separate_a(graph, from_node, to_node):
-                graph.add_edge(from_node, to_node, weight=mi)
+            if not self.try_to_separate_a(adj, from_node, to_node):
+                add_edge(from_node, to_node, mi)
 
         ################## Thinning #####################
 
-        edges = list(graph.edges)
-        for edge in edges:
-            from_node, to_node = edge
-            graph.remove_edge(from_node, to_node)
-            if (nx.has_path(graph, from_node, to_node) and
-                    not self.try_to_separate_a(graph, from_node, to_node)):
-                graph.add_edge(from_node, to_node)
-
-        edges = list(graph.edges)
-        for edge in edges:
-            from_node, to_node = edge
-            graph.remove_edge(from_node, to_node)
-            if (nx.has_path(graph, from_node, to_node) and
-                    not self.try_to_separate_b(graph, from_node, to_node)):
-                graph.add_edge(from_node, to_node)
+        # Snapshot the candidate edges once, ordered by ascending MI:
+        # removing weak edges first frees more potential separations for
+        # the stronger edges examined later. The second pass reuses the
+        # same ordering, skipping edges already removed.
+        candidates = sorted(
+            graph.edges(data='weight'), key=lambda edge: edge[2]
+        )
+        for from_node, to_node, weight in candidates:
+            remove_edge(from_node, to_node)
+            if (_connected(adj, from_node, to_node) and
+                    not self.try_to_separate_a(adj, from_node, to_node)):
+                add_edge(from_node, to_node, weight)
+
+        for from_node, to_node, weight in candidates:
+            if to_node not in adj[from_node]:
+                continue
+            remove_edge(from_node, to_node)
+            if (_connected(adj, from_node, to_node) and
+                    not self.try_to_separate_b(adj, from_node, to_node)):
+                add_edge(from_node, to_node, weight)
 
         # ORIENT EDGES DOES NOT WORK
         # oriented_edges = self.orient_edges(graph)
         # digraph = nx.DiGraph(oriented_edges)
         digraph = nx.dfs_tree(graph, df_features.columns[0])
 
-        for node in df_features.columns:
-            digraph.add_edge(self.class_node, node)
+        digraph.add_edges_from(
+            (self.class_node, node) for node in df_features.columns
+        )
 
         return DAG(digraph)
 
-    def try_to_separate_a(self, graph, node1, node2):
-        node1_neighbors = set(nx.neighbors(graph, node1))
-        node2_neighbors = set(nx.neighbors(graph, node2))
-        n1 = set()
-        n2 = set()
-        for path in nx.all_simple_paths(graph, source=node1, target=node2):
-            for node in path[1:-1]:
-                if node in node1_neighbors:
-                    n1.add(node)
-                if node in node2_neighbors:
-                    n2.add(node)
+    def _conditional_mutual_info_score(self, node1, node2, c):
+        '''
+        Compute conditional mutual information I(node1, node2 | c) on the
+        integer codes cached by estimate(), conditioning jointly on the
+        columns named in c. Results are memoized in self._cmi_cache, as
+        the same triples come up repeatedly across the thickening and
+        thinning phases.
+        '''
+        cache_key = (min(node1, node2), max(node1, node2), frozenset(c))
+        if cache_key in self._cmi_cache:
+            return self._cmi_cache[cache_key]
+        idx1 = self._name_to_idx[node1]
+        idx2 = self._name_to_idx[node2]
+        xi_codes = self._codes[:, idx1]
+        xj_codes = self._codes[:, idx2]
+        cond_names = sorted(c)
+        if cond_names:
+            key = np.zeros(len(xi_codes), dtype=np.int64)
+            for name in cond_names:
+                cond_idx = self._name_to_idx[name]
+                key = key * self._cards[cond_idx] + self._codes[:, cond_idx]
+            _, labels = np.unique(key, return_inverse=True)
+            n_groups = int(labels.max()) + 1
+        else:
+            labels = np.zeros(len(xi_codes), dtype=np.int64)
+            n_groups = 1
+        score = _cmi_from_codes(
+            xi_codes, xj_codes, labels,
+            int(self._cards[idx1]), int(self._cards[idx2]), n_groups,
+            self._scratch_order, self._scratch_starts, self._scratch_joint,
+        )
+        self._cmi_cache[cache_key] = score
+        return score
+
+    def _leave_one_out_cmi_scores(self, node1, node2, c):
+        '''
+        Compute I(node1, node2 | (c \\ {node}) u {class_node}) for every
+        node in c, returning (node, score) pairs in the iteration order
+        of c. The composite condition key is factorized once with a
+        per-column stride; each leave-one-out key is obtained by
+        subtracting that column's contribution instead of rebuilding the
+        key from scratch. Scores go through the same memoization cache
+        as _conditional_mutual_info_score.
+        '''
+        names = list(c)
+        idx1 = self._name_to_idx[node1]
+        idx2 = self._name_to_idx[node2]
+        xi_codes = self._codes[:, idx1]
+        xj_codes = self._codes[:, idx2]
+        class_idx = self._name_to_idx[self.class_node]
+        key_full = self._codes[:, class_idx].astype(np.int64)
+        stride = int(self._cards[class_idx])
+        contributions = []
+        for name in names:
+            cond_idx = self._name_to_idx[name]
+            contribution = self._codes[:, cond_idx].astype(np.int64) * stride
+            contributions.append(contribution)
+            key_full = key_full + contribution
+            stride *= int(self._cards[cond_idx])
+        scores = []
+        for k, name in enumerate(names):
+            subset = frozenset(n for n in names if n != name)
+            cache_key = (
+                min(node1, node2), max(node1, node2),
+                subset | {self.class_node},
+            )
+            if cache_key in self._cmi_cache:
+                scores.append((name, self._cmi_cache[cache_key]))
+                continue
+            _, labels = np.unique(
+                key_full - contributions[k], return_inverse=True
+            )
+            n_groups = int(labels.max()) + 1
+            score = _cmi_from_codes(
+                xi_codes, xj_codes, labels,
+                int(self._cards[idx1]), int(self._cards[idx2]), n_groups,
+                self._scratch_order, self._scratch_starts,
+                self._scratch_joint,
+            )
+            self._cmi_cache[cache_key] = score
+            scores.append((name, score))
+        return scores
+
+    def try_to_separate_a(self, adj, node1, node2):
+        node1_neighbors = adj[node1]
+        node2_neighbors = adj[node2]
+        reach_to_node1 = _reachable_without(adj, node1, node2)
+        reach_to_node2 = _reachable_without(adj, node2, node1)
+        on_path = (reach_to_node1 & reach_to_node2) - {node1, node2}
+        n1 = node1_neighbors & on_path
+        n2 = node2_neighbors & on_path
 
         # Remove the currently known child-nodes of node1 from N1
         # and child-nodes of node2 from N2 (?)
 
-        if len(n1) > len(n2):
+        # With both candidate sets empty the only condition left is the
+        # class node, and Drafting already established that the pair's
+        # class-conditional MI exceeds epsilon, so skip the CMI calls.
+        if not n1 and not n2:
+            return False
+
+        n2_used = False
+        if not n1 or (n2 and len(n1) > len(n2)):
             n1, n2 = n2, n1
+        if not n2:
+            # Only one candidate set; never switch to an empty n2.
+            n2_used = True
 
         skip_step = False
-        n2_used = False
         c = set(n1)
         while True:
             if not skip_step:
-                v = conditional_mutual_info_score(
-                    self.data[node1], self.data[node2],
-                    self.data[c.union({self.class_node})]
+                v = self._conditional_mutual_info_score(
+                    node1, node2, c.union({self.class_node})
                 )
                 if v < self.epsilon:
                     return True
@@ -249,19 +683,13 @@ class BNAugmentedNaiveBayesSearch(StructureEstimator):
                 else:
                     return False
             else:
-                values = []
-                conditions = []
-                for node in graph.nodes:
-                    ci = {n for n in c if n != node}
-                    conditions.append(ci)
-                    vi = conditional_mutual_info_score(
-                        self.data[node1], self.data[node2],
-                        self.data[ci.union({self.class_node})]
-                    )
-                    values.append(vi)
-                min_index = np.argmin(values)
-                vm = values[min_index]
-                cm = conditions[min_index]
+                vm = np.inf
+                cm = None
+                for node, vi in self._leave_one_out_cmi_scores(
+                        node1, node2, c):
+                    if vi < vm:
+                        vm = vi
+                        cm = {n for n in c if n != node}
                 if vm < self.epsilon:
                     return True
                 elif vm > v:
@@ -280,36 +708,26 @@ class BNAugmentedNaiveBayesSearch(StructureEstimator):
 
         return False
 
-    def try_to_separate_b(self, graph, node1, node2):
-        node1_neighbors = set(nx.neighbors(graph, node1))
-        node2_neighbors = set(nx.neighbors(graph, node2))
-        n1 = set()
-        n2 = set()
-        paths = list(nx.all_simple_paths(graph, source=node1, target=node2))
-        for path in paths:
-            for node in path[1:-1]:
-                if node in node1_neighbors:
-                    n1.add(node)
-                if node in node2_neighbors:
-                    n2.add(node)
-
-        n1_prime = set()
-        n1_neighbors = set()
-        for n in n1:
-            n1_neighbors.update(set(nx.neighbors(graph, n)))
-        for path in paths:
-            for node in path[1:-1]:
-                if node in n1_neighbors and node not in n1:
-                    n1_prime.add(node)
-
-        n2_prime = set()
-        n2_neighbors = set()
-        for n in n2:
-            n2_neighbors.update(set(nx.neighbors(graph, n)))
-        for path in paths:
-            for node in path[1:-1]:
-                if node in n2_neighbors and node not in n2:
-                    n2_prime.add(node)
+    def try_to_separate_b(self, adj, node1, node2):
+        node1_neighbors = adj[node1]
+        node2_neighbors = adj[node2]
+        reach_to_node1 = _reachable_without(adj, node1, node2)
+        reach_to_node2 = _reachable_without(adj, node2, node1)
+        on_path = (reach_to_node1 & reach_to_node2) - {node1, node2}
+        n1 = node1_neighbors & on_path
+        n2 = node2_neighbors & on_path
+
+        n1_neighbors = set().union(*(adj[n] for n in n1))
+        n1_prime = {
+            node for node in on_path
+            if node in n1_neighbors and node not in n1
+        }
+
+        n2_neighbors = set().union(*(adj[n] for n in n2))
+        n2_prime = {
+            node for node in on_path
+            if node in n2_neighbors and node not in n2
+        }
 
         if len(n1) + len(n1_prime) < len(n2) + len(n2_prime):
             c = set(n1)
@@ -319,20 +737,14 @@ class BNAugmentedNaiveBayesSearch(StructureEstimator):
             c.update(set(n2_prime))
 
         while True:
-            v = conditional_mutual_info_score(
-                self.data[node1], self.data[node2],
-                self.data[c.union({self.class_node})]
+            v = self._conditional_mutual_info_score(
+                node1, node2, c.union({self.class_node})
             )
             if v < self.epsilon:
                 return True
 
             c_prime = set(c)
-            for i in c:
-                ci = {n for n in c if n != i}
-                vi = conditional_mutual_info_score(
-                    self.data[node1], self.data[node2],
-                    self.data[ci.union({self.class_node})]
-                )
+            for i, vi in self._leave_one_out_cmi_scores(node1, node2, c):
                 if vi < self.epsilon:
                     return True
                 elif vi <= v + self.epsilon and i in c_prime:
@@ -381,25 +793,25 @@ class BNAugmentedNaiveBayesSearch(StructureEstimator):
         s1_neighbors = list(nx.neighbors(graph, s1))
         s2_neighbors = list(nx.neighbors(graph, s2))
         inter = set(s1_neighbors).intersection(set(s2_neighbors))
-        paths = list(nx.all_simple_paths(graph, source=s1, target=s2))
+        reach_to_s1 = _reachable_without(graph, s1, s2)
+        reach_to_s2 = _reachable_without(graph, s2, s1)
+        on_path = (reach_to_s1 & reach_to_s2) - {s1, s2}
         if (s1, s2) not in graph.edges and len(inter) > 0:
-            for path in paths:
-                for node in path[1:-1]:
-                    if node in s1_neighbors:
-                        n1.append(node)
-                    if node in s2_neighbors:
-                        n2.append(node)
+            n1 = [node for node in s1_neighbors if node in on_path]
+            n2 = [node for node in s2_neighbors if node in on_path]
 
         n1_prime = []
         n2_prime = []
-        n1_neighbors = [list(nx.neighbors(graph, n)) for n in n1]
-        n2_neighbors = [list(nx.neighbors(graph, n)) for n in n2]
-        for path in paths:
-            for node in path[1:-1]:
-                if node not in n1 and node in n1_neighbors:
-                    n1_prime.append(node)
-                if node not in n2 and node in n2_neighbors:
-                    n2_prime.append(node)
+        # Flat set unions: the old list-of-lists version made the
+        # membership tests below compare a node against whole neighbor
+        # lists, which never matched.
+        n1_neighbors = set().union(*(graph[n] for n in n1))
+        n2_neighbors = set().union(*(graph[n] for n in n2))
+        for node in on_path:
+            if node not in n1 and node in n1_neighbors:
+                n1_prime.append(node)
+            if node not in n2 and node in n2_neighbors:
+                n2_prime.append(node)
 
         if len(n1) + len(n1_prime) < len(n2) + len(n2_prime):
             c = list(n1)
@@ -409,20 +821,14 @@ class BNAugmentedNaiveBayesSearch(StructureEstimator):
             c.extend(list(n2_prime))
 
         while True:
-            v = conditional_mutual_info_score(
-                self.data[s1], self.data[s2],
-                self.data[c + [self.class_node]]
+            v = self._conditional_mutual_info_score(
+                s1, s2, c + [self.class_node]
             )
             if v < self.epsilon:
                 return oriented_edges
 
             c_prime = list(c)
-            for i in c:
-                ci = [n for n in c if n != i]
-                vi = conditional_mutual_info_score(
-                    self.data[s1], self.data[s2],
-                    self.data[ci + [self.class_node]]
-                )
+            for i, vi in self._leave_one_out_cmi_scores(s1, s2, c):
                 if vi <= v + self.epsilon:
                     c_prime = [n for n in c_prime if n != i]
                     oriented_edges.append((s1, i))
@@ -482,14 +888,19 @@ class ForestAugmentedNaiveBayesSearch(StructureEstimator):
         tree = nx.maximum_spanning_tree(graph)
 
         if not self.root_node:
+            codes, cards = _factorize_columns(df_features)
+            class_codes, class_card = _factorize_1d(
+                self.data.loc[:, self.class_node]
+            )
+            class_codes = class_codes.astype(np.int32)
             root_node = df_features.columns[0]
-            root_node_mi = mutual_info_score(
-                df_features.iloc[:, 0], self.data.loc[:, self.class_node]
+            root_node_mi = _mi_from_codes(
+                codes[:, 0], class_codes, int(cards[0]), class_card
             )
             for i in range(1, total_cols):
                 node = df_features.columns[i]
-                mi = mutual_info_score(
-                    df_features.iloc[:, i], self.data.loc[:, self.class_node]
+                mi = _mi_from_codes(
+                    codes[:, i], class_codes, int(cards[i]), class_card
                 )
                 if mi > root_node_mi:
                     root_node = node
@@ -508,7 +919,8 @@ class ForestAugmentedNaiveBayesSearch(StructureEstimator):
             if weights[key] < cmi_avg:
                 digraph.remove_edge(from_node, to_node)
 
-        for node in df_features.columns:
-            digraph.add_edge(self.class_node, node)
+        digraph.add_edges_from(
+            (self.class_node, node) for node in df_features.columns
+        )
 
         return DAG(digraph)